@@ -1,6 +1,10 @@
-from typing import List, Dict, Optional, Union
+from typing import Annotated, List, Dict, Optional, Union
 from enum import Enum
-from pydantic import BaseModel, Field, conint, confloat
+from pydantic import BaseModel, ConfigDict, Field
+
+
+# Shared configuration for request models
+REQUEST_CONFIG = ConfigDict(frozen=True, extra="forbid", str_strip_whitespace=True, use_enum_values=True)
 
 
 class Gender(str, Enum):
@@ -29,8 +33,10 @@ class FrameSize(str, Enum):
 
 
 class BMIRequest(BaseModel):
-    weight_kg: confloat(gt=0) = Field(..., description="Weight in kilograms")
-    height_cm: confloat(gt=0) = Field(..., description="Height in centimeters")
+    model_config = REQUEST_CONFIG
+
+    weight_kg: Annotated[float, Field(gt=0, description="Weight in kilograms")]
+    height_cm: Annotated[float, Field(gt=0, description="Height in centimeters")]
 
 
 class BMIResponse(BaseModel):
@@ -39,9 +45,11 @@ class BMIResponse(BaseModel):
 
 
 class BodyFrameRequest(BaseModel):
-    wrist_circumference_cm: confloat(gt=0) = Field(..., description="Wrist circumference in centimeters")
-    height_cm: confloat(gt=0) = Field(..., description="Height in centimeters")
-    gender: Gender = Field(..., description="Gender")
+    model_config = REQUEST_CONFIG
+
+    wrist_circumference_cm: Annotated[float, Field(gt=0, description="Wrist circumference in centimeters")]
+    height_cm: Annotated[float, Field(gt=0, description="Height in centimeters")]
+    gender: Annotated[Gender, Field(description="Gender")]
 
 
 class BodyFrameResponse(BaseModel):
@@ -49,13 +57,15 @@ class BodyFrameResponse(BaseModel):
 
 
 class BodyFatRequest(BaseModel):
-    gender: Gender = Field(..., description="Gender")
-    age: conint(ge=18) = Field(..., description="Age in years")
-    weight_kg: confloat(gt=0) = Field(..., description="Weight in kilograms")
-    height_cm: confloat(gt=0) = Field(..., description="Height in centimeters")
-    neck_circumference_cm: confloat(gt=0) = Field(..., description="Neck circumference in centimeters")
-    waist_circumference_cm: confloat(gt=0) = Field(..., description="Waist circumference in centimeters")
-    hip_circumference_cm: Optional[confloat(gt=0)] = Field(None, description="Hip circumference in centimeters (required for females)")
+    model_config = REQUEST_CONFIG
+
+    gender: Annotated[Gender, Field(description="Gender")]
+    age: Annotated[int, Field(ge=18, description="Age in years")]
+    weight_kg: Annotated[float, Field(gt=0, description="Weight in kilograms")]
+    height_cm: Annotated[float, Field(gt=0, description="Height in centimeters")]
+    neck_circumference_cm: Annotated[float, Field(gt=0, description="Neck circumference in centimeters")]
+    waist_circumference_cm: Annotated[float, Field(gt=0, description="Waist circumference in centimeters")]
+    hip_circumference_cm: Annotated[Optional[float], Field(gt=0, description="Hip circumference in centimeters (required for females)")] = None
 
 
 class BodyFatResponse(BaseModel):
@@ -64,13 +74,15 @@ class BodyFatResponse(BaseModel):
 
 
 class MacroRequest(BaseModel):
-    gender: Gender = Field(..., description="Gender")
-    age: conint(ge=18) = Field(..., description="Age in years")
-    weight_kg: confloat(gt=0) = Field(..., description="Weight in kilograms")
-    height_cm: confloat(gt=0) = Field(..., description="Height in centimeters")
-    activity_level: ActivityLevel = Field(..., description="Activity level")
-    goal: Goal = Field(..., description="Weight goal")
-    body_fat_percentage: Optional[confloat(ge=0, le=100)] = Field(None, description="Body fat percentage if known")
+    model_config = REQUEST_CONFIG
+
+    gender: Annotated[Gender, Field(description="Gender")]
+    age: Annotated[int, Field(ge=18, description="Age in years")]
+    weight_kg: Annotated[float, Field(gt=0, description="Weight in kilograms")]
+    height_cm: Annotated[float, Field(gt=0, description="Height in centimeters")]
+    activity_level: Annotated[ActivityLevel, Field(description="Activity level")]
+    goal: Annotated[Goal, Field(description="Weight goal")]
+    body_fat_percentage: Annotated[Optional[float], Field(ge=0, le=100, description="Body fat percentage if known")] = None
 
 
 class MacroResponse(BaseModel):
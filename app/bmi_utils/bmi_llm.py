@@ -1,76 +1,49 @@
-import json
-from openai import OpenAI
+from typing import Tuple
 
+import httpx
+import orjson
+from openai import AsyncOpenAI
 
-NUTRITION_PROMPT = """
-## Instructions
-You are an intelligent matching agent. Your task is to evaluate a list of food item descriptions and determine which 
-one best matches a given query string. Follow all guidelines precisely and do not deviate from the required output 
-structure.
 
-## Goal
-Identify and return the food item from the provided list that most closely corresponds to the query string. Your 
-selection should prioritize:
-- Direct semantic alignment with the query (e.g., "apple" → "red delicious, slices, raw")
-- Items that represent a single, whole, or primary ingredient rather than composite or processed foods
-- High-confidence matches based on meaning, not just text similarity
+NUTRITION_PROMPT = (
+    "The first line is a food query, each following line is 'index:description'. Pick the index whose "
+    "description best matches the query, preferring a whole, primary ingredient. Return JSON "
+    "{\"index\": int|null}; null if no confident match."
+)
 
-## Return Format
-Return your response as a single JSON object in one of the following formats:
-
-**If a confident match is found:**
-```json
-{"index": 2, "description": "red delicious, slices, raw"}
-```
-
-**If no confident match is found:**
-```json
-{"index": null, "description": "No confident match found"}
-```
-
-Return ONLY this JSON object and nothing else.
-
-## Warnings
-- Do NOT return explanations, ranked lists, or multiple results.
-- Do NOT return partial matches unless they clearly and confidently reflect the intent of the query.
-- Do NOT include any commentary or formatting outside of the required JSON.
-
-## Contextual Information
-- The query string is a simple food term (e.g., "apple", "flank steak", "cottage cheese").
-- The food item list is presented as a JSON object with a search_results array containing food descriptions and their 
-indices.
-- Your job is to select the one description that best represents the food item described by the query string.
-
-## Example Input
-```json
-{
-  "query": "apple",
-  "search_results": [
-    {"index": 0, "description": "apple, croissant"},
-    {"index": 1, "description": "apple pie"},
-    {"index": 2, "description": "red delicious, slices, raw"}
-  ]
+# Structured output schema constraining the reply to {"index": int | null}
+NUTRITION_FORMAT = {
+    "type": "json_schema",
+    "name": "pick",
+    "schema": {
+        "type": "object",
+        "properties": {
+            "index": {"type": ["integer", "null"]}
+        },
+        "required": ["index"],
+        "additionalProperties": False
+    },
+    "strict": True
 }
-```
 
-## Example Output
-```json
-{"index": 2, "description": "red delicious, slices, raw"}
-```
-"""
 
+def create_openai_client() -> AsyncOpenAI:
+    """Create the OpenAI client shared by the app, backed by a pooled HTTP/2 connection."""
+    return AsyncOpenAI(
+        http_client=httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=16),
+            timeout=30
+        )
+    )
 
-def get_food_item_from_llm(query: str, search_results: list) -> dict:
-    """Get the most likely food item from the LLM."""
-    client = OpenAI()
 
-    # Format the search results
-    llm_input = json.dumps({
-        "query": query,
-        "search_results": [{"index": i, "description": sr} for i, sr in enumerate(search_results)]
-    })
+async def get_food_item_from_llm(client: AsyncOpenAI, query: str, search_results: Tuple[str, ...]) -> dict:
+    """Get the most likely food item from the LLM."""
+    # Format the search results as compact numbered lines
+    llm_input = query + "\n" + "\n".join(f"{i}:{sr}" for i, sr in enumerate(search_results))
 
-    response = client.responses.create(
+    response = await client.responses.create(
         model="gpt-4.1-nano",
         input=[
             {
@@ -93,13 +66,11 @@ def get_food_item_from_llm(query: str, search_results: list) -> dict:
             }
         ],
         text={
-            "format": {
-                "type": "json_object"
-            }
+            "format": NUTRITION_FORMAT
         },
         temperature=0.6,
-        max_output_tokens=256,
+        max_output_tokens=16,
         top_p=0.95,
         store=False
     )
-    return json.loads(response.output_text)
\ No newline at end of file
+    return orjson.loads(response.output_text)
\ No newline at end of file
@@ -0,0 +1,162 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import httpx
+
+
+# USDA FoodData Central API base URL
+USDA_BASE_URL = "https://api.nal.usda.gov/fdc/v1"
+
+# USDA FoodData Central nutrient IDs mapped to their slot in
+# (calories, protein, carbs, fat, fiber, sugar)
+_NUTRIENT_SLOT = {
+    2047: 0,  # Energy (kcal)
+    1008: 0,  # Energy (kcal) secondary
+    1003: 1,  # Protein
+    1005: 2,  # Carbohydrates
+    1004: 3,  # Total fat
+    1079: 4,  # Fiber
+    2000: 5,  # Total sugars
+}
+
+_MISSING = object()
+
+
+@dataclass(frozen=True, slots=True)
+class SearchResult:
+    """Foods matching a USDA search, as parallel tuples of FDC IDs and descriptions."""
+    fdc_ids: Tuple[int, ...]
+    descriptions: Tuple[str, ...]
+
+
+class LRUCache:
+    """Small least-recently-used cache with an optional time-to-live for its entries."""
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            return default
+        stored_at, value = entry
+        if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+def _build_nutrient_extractor():
+    """Generate a function that reads the nutrient slots from a foodNutrients list with an unrolled if/elif chain."""
+    lines = [
+        "def extract(nutrients):",
+        "    vals = [0.0] * 6",
+        "    for n in nutrients:",
+        "        if 'nutrient' not in n:",
+        "            continue",
+        "        nid = n['nutrient'].get('id')",
+    ]
+    seen_slots = set()
+    for position, (nutrient_id, slot) in enumerate(_NUTRIENT_SLOT.items()):
+        keyword = "if" if position == 0 else "elif"
+        # An ID sharing a slot with an earlier one is a fallback, only used while the slot is still zero
+        if slot in seen_slots:
+            lines.append(f"        {keyword} nid == {nutrient_id}:")
+            lines.append(f"            if vals[{slot}] == 0.0:")
+            lines.append(f"                vals[{slot}] = n.get('amount', 0)")
+        else:
+            lines.append(f"        {keyword} nid == {nutrient_id}:")
+            lines.append(f"            vals[{slot}] = n.get('amount', 0)")
+        seen_slots.add(slot)
+    lines.append("    return vals")
+
+    namespace = {}
+    exec(compile("\n".join(lines) + "\n", "<nutrient_extractor>", "exec"), namespace)
+    return namespace["extract"]
+
+
+_extract_nutrients = _build_nutrient_extractor()
+
+
+FOOD_SEARCH_CACHE = LRUCache(maxsize=1024, ttl=3600.0)
+FOOD_DETAIL_CACHE = LRUCache(maxsize=4096)
+
+
+def parse_food_detail(food_detail: Dict) -> Tuple[float, ...]:
+    """Extract (calories, protein, carbs, fat, fiber, sugar, serving_size) from a USDA food detail payload."""
+    # Invalid values raise here, so the food item is reported as an error and never cached
+    values = [float(value) for value in _extract_nutrients(food_detail.get("foodNutrients", []))]
+    if not all(math.isfinite(value) for value in values):
+        raise ValueError("Food has invalid nutrient values")
+
+    serving_size = food_detail.get("servingSize", 100)
+    serving_unit = food_detail.get("servingSizeUnit", "g")
+
+    # Convert to 100g basis if serving size is not in grams
+    if serving_unit.lower() != "g":
+        serving_size = 100
+
+    serving_size = float(serving_size)
+    if not math.isfinite(serving_size) or serving_size <= 0:
+        raise ValueError("Food has an invalid serving size")
+
+    return (*values, serving_size)
+
+
+async def search_foods(
+    client: httpx.AsyncClient,
+    ingredient: str,
+    api_key: str,
+    data_type: str = "Foundation,SR Legacy"
+) -> SearchResult:
+    """Search USDA FoodData Central for an ingredient, reusing recent results."""
+    key = (ingredient, data_type)
+    result = FOOD_SEARCH_CACHE.get(key)
+    if result is not None:
+        return result
+
+    response = await client.get(
+        f"{USDA_BASE_URL}/foods/search",
+        params={
+            "api_key": api_key,
+            "query": ingredient,
+            "dataType": data_type,
+            "pageSize": 25 # Get the first 25 foods that match
+        }
+    )
+    response.raise_for_status()
+    foods = response.json().get("foods") or ()
+    result = SearchResult(
+        fdc_ids=tuple(food["fdcId"] for food in foods),
+        descriptions=tuple(food.get("description", "") for food in foods)
+    )
+    FOOD_SEARCH_CACHE.set(key, result)
+    return result
+
+
+async def fetch_food_detail(client: httpx.AsyncClient, fdc_id: int, api_key: str) -> Tuple[float, ...]:
+    """Fetch the parsed nutrition data for a USDA food item, reusing previously fetched items."""
+    values = FOOD_DETAIL_CACHE.get(fdc_id)
+    if values is not None:
+        return values
+
+    response = await client.get(f"{USDA_BASE_URL}/food/{fdc_id}", params={"api_key": api_key})
+    response.raise_for_status()
+    values = parse_food_detail(response.json())
+    FOOD_DETAIL_CACHE.set(fdc_id, values)
+    return values
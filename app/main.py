@@ -1,10 +1,16 @@
 import os
-from typing import List, Dict, Optional, Union
+import asyncio
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple, Union
 from enum import Enum
 
 import httpx
-from fastapi import FastAPI, Query, HTTPException, Depends
+import numpy as np
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.responses import ORJSONResponse
 from fastapi_mcp import FastApiMCP
+from openai import AsyncOpenAI
 from pydantic import BaseModel, Field, conint, confloat
 from dotenv import load_dotenv
 
@@ -29,11 +35,54 @@ from bmi_utils.bmi_helpers import (
     get_usda_api_key,
     get_openai_api_key
 )
-from bmi_utils.bmi_llm import get_food_item_from_llm
+from bmi_utils.bmi_llm import create_openai_client, get_food_item_from_llm
+from bmi_utils.bmi_math import (
+    navy_body_fat_male,
+    navy_body_fat_female,
+    mifflin_st_jeor_bmr,
+    warm_up
+)
+from bmi_utils.bmi_usda import search_foods, fetch_food_detail
+
+
+# Multipliers from BMR to total daily energy expenditure
+_ACTIVITY_MULTIPLIERS = {
+    ActivityLevel.SEDENTARY: 1.2,
+    ActivityLevel.LIGHT: 1.375,
+    ActivityLevel.MODERATE: 1.55,
+    ActivityLevel.ACTIVE: 1.725,
+    ActivityLevel.VERY_ACTIVE: 1.9
+}
 
+# Calorie adjustment per weight goal
+_GOAL_FACTORS = {
+    Goal.MAINTAIN: 1.0,
+    Goal.LOSE: 0.8,  # 20% deficit
+    Goal.GAIN: 1.1  # 10% surplus
+}
 
-# Load environment variables from .env file
-load_dotenv()
+# Maximum number of USDA requests in flight at the same time across the whole app
+_USDA_CONCURRENCY = 8
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load the configuration, open the shared USDA and OpenAI clients and compile the numeric kernels once at startup."""
+    # Load environment variables from .env file
+    load_dotenv()
+    app.state.usda_api_key = get_usda_api_key()
+    app.state.httpx_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32)
+    )
+    app.state.usda_semaphore = asyncio.Semaphore(_USDA_CONCURRENCY)
+    # The LLM is only used to pick between search results when an OpenAI API key is available
+    app.state.openai_client = create_openai_client() if get_openai_api_key() else None
+    warm_up()
+    yield
+    await app.state.httpx_client.aclose()
+    if app.state.openai_client is not None:
+        await app.state.openai_client.close()
 
 
 # Initialize FastAPI app
@@ -41,9 +90,134 @@ app = FastAPI(
     title="Health Information API",
     description="API for calculating various health metrics and nutritional information",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 
+async def _resolve_ingredient(
+    client: httpx.AsyncClient,
+    openai_client: Optional[AsyncOpenAI],
+    semaphore: asyncio.Semaphore,
+    ingredient: str,
+    api_key: str
+) -> Tuple[str, Tuple[float, ...]]:
+    """Search, pick and fetch the nutrition data of a single ingredient."""
+    # The semaphore only guards USDA calls, so a slow LLM reply does not hold a USDA slot
+    async with semaphore:
+        result = await search_foods(client, ingredient, api_key)
+    if not result.fdc_ids:
+        raise LookupError("Food not found")
+
+    # Only ask the LLM when there is more than one candidate
+    index = 0
+    if len(result.fdc_ids) > 1 and openai_client is not None:
+        try:
+            pick = await get_food_item_from_llm(openai_client, ingredient, result.descriptions)
+            chosen_index = pick.get("index")
+            if chosen_index is not None and not 0 <= chosen_index < len(result.fdc_ids):
+                raise IndexError(f"index {chosen_index} out of range")
+        except Exception as e:
+            raise RuntimeError(f"Error from LLM: {e}") from e
+        if chosen_index is not None:
+            index = chosen_index
+
+    async with semaphore:
+        nutrients = await fetch_food_detail(client, result.fdc_ids[index], api_key)
+    return result.descriptions[index] or ingredient, nutrients
+
+
+# Cached calculator cores, keyed on the validated request values
+@lru_cache(maxsize=8192)
+def _bmi_core(weight_kg: float, height_cm: float) -> Tuple[float, str]:
+    """Calculate BMI rounded to two decimals and its category."""
+    inv_height_sq = 10000.0 / (height_cm * height_cm)
+    bmi = weight_kg * inv_height_sq
+    return round(bmi, 2), get_bmi_category(bmi)
+
+
+@lru_cache(maxsize=8192)
+def _body_frame_core(wrist_circumference_cm: float, height_cm: float, gender: Gender) -> FrameSize:
+    """Calculate body frame size from the height to wrist circumference ratio."""
+    # Calculate r value (height/wrist circumference)
+    r = height_cm / wrist_circumference_cm
+    
+    if gender == Gender.MALE:
+        if r > 10.4:
+            return FrameSize.SMALL
+        elif r < 9.6:
+            return FrameSize.LARGE
+        else:
+            return FrameSize.MEDIUM
+    else:  # Female
+        if r > 11.0:
+            return FrameSize.SMALL
+        elif r < 10.1:
+            return FrameSize.LARGE
+        else:
+            return FrameSize.MEDIUM
+
+
+@lru_cache(maxsize=8192)
+def _body_fat_core(
+    gender: Gender,
+    height_cm: float,
+    neck_circumference_cm: float,
+    waist_circumference_cm: float,
+    hip_circumference_cm: Optional[float]
+) -> Tuple[float, str]:
+    """Calculate body fat percentage rounded to two decimals and its category."""
+    # U.S. Navy method
+    if gender == Gender.MALE:
+        body_fat = navy_body_fat_male(waist_circumference_cm, neck_circumference_cm, height_cm)
+    else:  # Female
+        body_fat = navy_body_fat_female(
+            waist_circumference_cm,
+            hip_circumference_cm,
+            neck_circumference_cm,
+            height_cm
+        )
+    
+    return round(body_fat, 2), get_body_fat_category(gender, body_fat)
+
+
+@lru_cache(maxsize=8192)
+def _macros_core(
+    gender: Gender,
+    age: int,
+    weight_kg: float,
+    height_cm: float,
+    activity_level: ActivityLevel,
+    goal: Goal,
+    body_fat_percentage: Optional[float]
+) -> Tuple[int, int, int, int]:
+    """Calculate daily calories and protein, carbs and fat grams."""
+    # Calculate BMR using Mifflin-St Jeor Equation
+    bmr = mifflin_st_jeor_bmr(weight_kg, height_cm, age, gender == Gender.MALE)
+    
+    # Apply activity multiplier
+    tdee = bmr * _ACTIVITY_MULTIPLIERS[activity_level]
+    
+    # Adjust for goal
+    calories = int(tdee * _GOAL_FACTORS[goal])
+    
+    # Calculate macros
+    # Protein: 1.8g per kg of lean body mass or 1.6g per kg of total weight if body fat unknown
+    if body_fat_percentage is not None:
+        lean_mass = weight_kg * (1 - body_fat_percentage / 100)
+        protein_g = int(lean_mass * 1.8)
+    else:
+        protein_g = int(weight_kg * 1.6)
+    
+    # Fat: 25% of calories
+    fat_g = int((calories * 0.25) / 9)
+    
+    # Remaining calories from carbs
+    carbs_g = int((calories - (protein_g * 4) - (fat_g * 9)) / 4)
+    
+    return calories, protein_g, carbs_g, fat_g
+
+
 # Endpoints
 @app.post(
     "/bmi",
@@ -55,14 +229,12 @@ app = FastAPI(
 )
 def calculate_bmi(request: BMIRequest):
     """Calculate BMI and determine the BMI category."""
-    height_m = request.height_cm / 100
-    bmi = request.weight_kg / (height_m * height_m)
-    category = get_bmi_category(bmi)
+    bmi, category = _bmi_core(request.weight_kg, request.height_cm)
     
-    return BMIResponse(
-        bmi=round(bmi, 2),
-        category=category
-    )
+    return ORJSONResponse({
+        "bmi": bmi,
+        "category": category
+    })
 
 
 @app.post(
@@ -75,25 +247,9 @@ def calculate_bmi(request: BMIRequest):
 )
 def calculate_body_frame(request: BodyFrameRequest):
     """Calculate body frame size based on wrist circumference and height."""
-    # Calculate r value (height/wrist circumference)
-    r = request.height_cm / request.wrist_circumference_cm
-    
-    if request.gender == Gender.MALE:
-        if r > 10.4:
-            frame_size = FrameSize.SMALL
-        elif r < 9.6:
-            frame_size = FrameSize.LARGE
-        else:
-            frame_size = FrameSize.MEDIUM
-    else:  # Female
-        if r > 11.0:
-            frame_size = FrameSize.SMALL
-        elif r < 10.1:
-            frame_size = FrameSize.LARGE
-        else:
-            frame_size = FrameSize.MEDIUM
+    frame_size = _body_frame_core(request.wrist_circumference_cm, request.height_cm, request.gender)
     
-    return BodyFrameResponse(frame_size=frame_size)
+    return ORJSONResponse({"frame_size": frame_size})
 
 
 @app.post(
@@ -112,24 +268,18 @@ def calculate_body_fat(request: BodyFatRequest):
             detail="Hip circumference is required for females"
         )
     
-    height_m = request.height_cm / 100
-    
-    # U.S. Navy method
-    if request.gender == Gender.MALE:
-        body_fat = 495 / (1.0324 - 0.19077 * (
-            (request.waist_circumference_cm - request.neck_circumference_cm) / 2.54
-        ) + 0.15456 * (request.height_cm / 2.54)) - 450
-    else:  # Female
-        body_fat = 495 / (1.29579 - 0.35004 * (
-            (request.waist_circumference_cm + request.hip_circumference_cm - request.neck_circumference_cm) / 2.54
-        ) + 0.22100 * (request.height_cm / 2.54)) - 450
-    
-    category = get_body_fat_category(request.gender, body_fat)
-    
-    return BodyFatResponse(
-        body_fat_percentage=round(body_fat, 2),
-        category=category
+    body_fat, category = _body_fat_core(
+        request.gender,
+        request.height_cm,
+        request.neck_circumference_cm,
+        request.waist_circumference_cm,
+        request.hip_circumference_cm
     )
+    
+    return ORJSONResponse({
+        "body_fat_percentage": body_fat,
+        "category": category
+    })
 
 
 @app.post(
@@ -142,51 +292,22 @@ def calculate_body_fat(request: BodyFatRequest):
 )
 def calculate_macros(request: MacroRequest):
     """Calculate daily calorie and macronutrient targets."""
-    # Calculate BMR using Mifflin-St Jeor Equation
-    if request.gender == Gender.MALE:
-        bmr = 10 * request.weight_kg + 6.25 * request.height_cm - 5 * request.age + 5
-    else:  # Female
-        bmr = 10 * request.weight_kg + 6.25 * request.height_cm - 5 * request.age - 161
-    
-    # Apply activity multiplier
-    activity_multipliers = {
-        ActivityLevel.SEDENTARY: 1.2,
-        ActivityLevel.LIGHT: 1.375,
-        ActivityLevel.MODERATE: 1.55,
-        ActivityLevel.ACTIVE: 1.725,
-        ActivityLevel.VERY_ACTIVE: 1.9
-    }
-    
-    tdee = bmr * activity_multipliers[request.activity_level]
-    
-    # Adjust for goal
-    if request.goal == Goal.LOSE:
-        calories = int(tdee * 0.8)  # 20% deficit
-    elif request.goal == Goal.GAIN:
-        calories = int(tdee * 1.1)  # 10% surplus
-    else:  # Maintain
-        calories = int(tdee)
-    
-    # Calculate macros
-    # Protein: 1.8g per kg of lean body mass or 1.6g per kg of total weight if body fat unknown
-    if request.body_fat_percentage is not None:
-        lean_mass = request.weight_kg * (1 - request.body_fat_percentage / 100)
-        protein_g = int(lean_mass * 1.8)
-    else:
-        protein_g = int(request.weight_kg * 1.6)
-    
-    # Fat: 25% of calories
-    fat_g = int((calories * 0.25) / 9)
-    
-    # Remaining calories from carbs
-    carbs_g = int((calories - (protein_g * 4) - (fat_g * 9)) / 4)
-    
-    return MacroResponse(
-        calories=calories,
-        protein_g=protein_g,
-        carbs_g=carbs_g,
-        fat_g=fat_g
+    calories, protein_g, carbs_g, fat_g = _macros_core(
+        request.gender,
+        request.age,
+        request.weight_kg,
+        request.height_cm,
+        request.activity_level,
+        request.goal,
+        request.body_fat_percentage
     )
+    
+    return ORJSONResponse({
+        "calories": calories,
+        "protein_g": protein_g,
+        "carbs_g": carbs_g,
+        "fat_g": fat_g
+    })
 
 
 @app.get(
@@ -198,177 +319,85 @@ def calculate_macros(request: MacroRequest):
     description="Calculate the nutritional content of a list of food ingredients and amounts, using the USDA FoodData Central API."
 )
 async def calculate_food_nutrition(
+    request: Request,
     ingredients: List[str] = Query(..., description="List of food ingredients (e.g., 'apple', 'chicken breast')"),
     amounts: List[float] = Query(..., description="List of amounts in grams corresponding to each ingredient"),
-    api_key: str = Depends(get_usda_api_key)
 ):
     """Calculate the nutritional content of a list of food ingredients and amounts."""
+    api_key = request.app.state.usda_api_key
     if len(ingredients) != len(amounts):
         raise HTTPException(
             status_code=400,
             detail="The number of ingredients must match the number of amounts"
         )
     
-    # Initialize totals
-    total_calories = 0.0
-    total_protein = 0.0
-    total_carbs = 0.0
-    total_fat = 0.0
-    total_fiber = 0.0
-    total_sugar = 0.0
-    foods_data = []
+    # Per-food columns: names, errors, amounts and nutrients (calories, protein, carbs, fat, fiber, sugar)
+    names = list(ingredients)
+    errors: List[Optional[str]] = [None] * len(ingredients)
+    amounts_g = np.asarray(amounts, dtype=np.float64)
+    serving_sizes = np.ones(len(ingredients), dtype=np.float64)
+    per_food = np.zeros((len(ingredients), 6), dtype=np.float64)
     
-    # USDA FoodData Central API base URL
-    base_url = "https://api.nal.usda.gov/fdc/v1"
+    client = request.app.state.httpx_client
+    openai_client = request.app.state.openai_client
+    semaphore = request.app.state.usda_semaphore
+
+    async def process(ingredient: str):
+        try:
+            return await _resolve_ingredient(client, openai_client, semaphore, ingredient, api_key)
+        except Exception as e:
+            return e
+
+    # Resolve every ingredient concurrently
+    if hasattr(asyncio, "TaskGroup"):
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(process(ingredient)) for ingredient in ingredients]
+        outcomes = [task.result() for task in tasks]
+    else:  # Python 3.10
+        outcomes = await asyncio.gather(*[process(ingredient) for ingredient in ingredients])
     
-    async with httpx.AsyncClient() as client:
-        for i, (ingredient, amount) in enumerate(zip(ingredients, amounts)):
-            # Search for the food item
-            search_url = f"{base_url}/foods/search"
-            params = {
-                "api_key": api_key,
-                "query": ingredient,
-                "dataType": "Foundation,SR Legacy",
-                "pageSize": 25 # Get the first 25 foods that match
-            }
-            
-            try:
-                search_response = await client.get(search_url, params=params)
-                search_response.raise_for_status()
-                search_data = search_response.json()
-                
-                if not search_data.get("foods") or len(search_data["foods"]) == 0:
-                    foods_data.append({
-                        "name": ingredient,
-                        "amount_g": amount,
-                        "calories": 0,
-                        "protein_g": 0,
-                        "carbs_g": 0,
-                        "fat_g": 0,
-                        "fiber_g": 0,
-                        "sugar_g": 0,
-                        "error": "Food not found"
-                    })
-                    continue
-
-                # Check if OpenAI API key is available and use LLM to get the most likely food item
-                if not get_openai_api_key():
-                    food = search_data["foods"][0]
-                else:
-                    try:
-                        chosen_index = get_food_item_from_llm(
-                            ingredient,
-                            [food["description"] for food in search_data["foods"]]
-                        )["index"]
-                    except Exception as e:
-                        raise HTTPException(status_code=500, detail=f"Error from LLM: {e}")
-                    if not chosen_index:
-                        food = search_data["foods"][0]
-                    else:
-                        food = search_data["foods"][chosen_index]
-
-                food_id = food["fdcId"]
-                
-                # Get detailed nutrition data
-                detail_url = f"{base_url}/food/{food_id}"
-                detail_params = {"api_key": api_key}
-                
-                detail_response = await client.get(detail_url, params=detail_params)
-                detail_response.raise_for_status()
-                food_detail = detail_response.json()
-                
-                # Extract nutrition data
-                nutrients = food_detail.get("foodNutrients", [])
-                
-                # Initialize nutrient values
-                calories = 0
-                protein = 0
-                carbs = 0
-                fat = 0
-                fiber = 0
-                sugar = 0
-                
-                # Map nutrient IDs to their values
-                # These IDs are based on USDA FoodData Central API
-                for nutrient in nutrients:
-                    nutrient_id = nutrient.get("nutrient", {}).get("id")
-                    value = nutrient.get("amount", 0)
-                    # print(f"{nutrient_id} / {nutrient.get('nutrient', {}).get('name')}: {value}")
-                    
-                    if nutrient_id == 2047:  # Energy (kcal)
-                        calories = value
-                    elif nutrient_id == 1008 and calories == 0.0:  # Energy (kcal) secondary
-                        calories = value
-                    elif nutrient_id == 1003:  # Protein
-                        protein = value
-                    elif nutrient_id == 1005:  # Carbohydrates
-                        carbs = value
-                    elif nutrient_id == 1004:  # Total fat
-                        fat = value
-                    elif nutrient_id == 1079:  # Fiber
-                        fiber = value
-                    elif nutrient_id == 2000:  # Total sugars
-                        sugar = value
-                
-                # Calculate nutrition based on the amount
-                serving_size = food_detail.get("servingSize", 100)
-                serving_unit = food_detail.get("servingSizeUnit", "g")
-                
-                # Convert to 100g basis if serving size is not in grams
-                if serving_unit.lower() != "g":
-                    serving_size = 100
-                
-                # Calculate nutrition for the specified amount
-                factor = amount / serving_size
-                item_calories = calories * factor
-                item_protein = protein * factor
-                item_carbs = carbs * factor
-                item_fat = fat * factor
-                item_fiber = fiber * factor
-                item_sugar = sugar * factor
-                
-                # Add to totals
-                total_calories += item_calories
-                total_protein += item_protein
-                total_carbs += item_carbs
-                total_fat += item_fat
-                total_fiber += item_fiber
-                total_sugar += item_sugar
-                
-                # Add food data
-                foods_data.append({
-                    "name": food.get("description", ingredient),
-                    "amount_g": amount,
-                    "calories": round(item_calories, 2),
-                    "protein_g": round(item_protein, 2),
-                    "carbs_g": round(item_carbs, 2),
-                    "fat_g": round(item_fat, 2),
-                    "fiber_g": round(item_fiber, 2),
-                    "sugar_g": round(item_sugar, 2)
-                })
-                
-            except Exception as e:
-                foods_data.append({
-                    "name": ingredient,
-                    "amount_g": amount,
-                    "calories": 0,
-                    "protein_g": 0,
-                    "carbs_g": 0,
-                    "fat_g": 0,
-                    "fiber_g": 0,
-                    "sugar_g": 0,
-                    "error": str(e)
-                })
+    # Failed items keep zero nutrients, so they add nothing to the totals
+    for i, outcome in enumerate(outcomes):
+        if isinstance(outcome, Exception):
+            errors[i] = str(outcome)
+            continue
+        name, (*nutrients, serving_size) = outcome
+        names[i] = name
+        per_food[i] = nutrients
+        serving_sizes[i] = serving_size
     
-    return FoodNutritionResponse(
-        total_calories=round(total_calories, 2),
-        total_protein_g=round(total_protein, 2),
-        total_carbs_g=round(total_carbs, 2),
-        total_fat_g=round(total_fat, 2),
-        total_fiber_g=round(total_fiber, 2),
-        total_sugar_g=round(total_sugar, 2),
-        foods=foods_data
+    # Calculate nutrition for the specified amounts
+    scaled = per_food * (amounts_g / serving_sizes)[:, None]
+    total_calories, total_protein, total_carbs, total_fat, total_fiber, total_sugar = (
+        scaled.sum(axis=0).round(2).tolist()
     )
+    
+    # Add food data
+    foods_data = [
+        {
+            "name": name,
+            "amount_g": amount,
+            "calories": calories,
+            "protein_g": protein,
+            "carbs_g": carbs,
+            "fat_g": fat,
+            "fiber_g": fiber,
+            "sugar_g": sugar,
+            **({"error": error} if error is not None else {})
+        }
+        for name, amount, error, (calories, protein, carbs, fat, fiber, sugar)
+        in zip(names, amounts, errors, np.round(scaled, 2).tolist())
+    ]
+    
+    return ORJSONResponse({
+        "total_calories": total_calories,
+        "total_protein_g": total_protein,
+        "total_carbs_g": total_carbs,
+        "total_fat_g": total_fat,
+        "total_fiber_g": total_fiber,
+        "total_sugar_g": total_sugar,
+        "foods": foods_data
+    })
 
 
 # Initialize FastAPI-MCP
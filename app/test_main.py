@@ -1,15 +1,38 @@
 import os
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, AsyncMock
 
 from main import app
-
-client = TestClient(app)
+from bmi_utils.bmi_classes import Gender
+from bmi_utils.bmi_helpers import get_bmi_category, get_body_fat_category
+from bmi_utils.bmi_usda import FOOD_SEARCH_CACHE, FOOD_DETAIL_CACHE, parse_food_detail
 
 # Mock environment variable for tests
 os.environ["USDA_API_KEY"] = "test_api_key"
 
+client = TestClient(app)
+
+@pytest.fixture(scope="module", autouse=True)
+def run_lifespan():
+    """Run the app startup and shutdown around the tests."""
+    with client:
+        yield
+
+@pytest.fixture(autouse=True)
+def clear_usda_caches():
+    """Start every test with empty USDA caches."""
+    FOOD_SEARCH_CACHE.clear()
+    FOOD_DETAIL_CACHE.clear()
+
+def _usda_response(payload):
+    """Build a mocked successful USDA response returning the given JSON payload."""
+    response = MagicMock()
+    response.raise_for_status = MagicMock()
+    response.json.return_value = payload
+    return response
+
 def test_calculate_bmi():
     """Test the BMI calculation endpoint."""
     response = client.post(
@@ -23,6 +46,32 @@ def test_calculate_bmi():
     assert data["bmi"] == pytest.approx(22.86, 0.01)
     assert data["category"] == "Normal weight"
 
+@pytest.mark.parametrize("bmi, expected", [
+    (18.4, "Underweight"),
+    (18.5, "Normal weight"),
+    (25.0, "Overweight"),
+    (30.0, "Obese"),
+])
+def test_bmi_category_cutoffs(bmi, expected):
+    """Test that a BMI exactly on a cutoff falls into the higher category."""
+    assert get_bmi_category(bmi) == expected
+
+@pytest.mark.parametrize("gender, body_fat, expected", [
+    (Gender.MALE, 5.9, "Essential fat"),
+    (Gender.MALE, 6, "Athletic"),
+    (Gender.MALE, 14, "Fitness"),
+    (Gender.MALE, 18, "Average"),
+    (Gender.MALE, 25, "Obese"),
+    (Gender.FEMALE, 15.9, "Essential fat"),
+    (Gender.FEMALE, 16, "Athletic"),
+    (Gender.FEMALE, 24, "Fitness"),
+    (Gender.FEMALE, 31, "Average"),
+    (Gender.FEMALE, 39, "Obese"),
+])
+def test_body_fat_category_cutoffs(gender, body_fat, expected):
+    """Test that a body fat percentage exactly on a cutoff falls into the higher category."""
+    assert get_body_fat_category(gender, body_fat) == expected
+
 def test_calculate_body_frame():
     """Test the body frame size calculation endpoint."""
     # Test for male
@@ -144,13 +193,56 @@ def test_calculate_macros():
     assert "carbs_g" in data
     assert "fat_g" in data
 
-@patch('httpx.AsyncClient')
+@pytest.mark.parametrize("nutrients, expected_calories", [
+    ([{"nutrient": {"id": 2047}, "amount": 52.0}, {"nutrient": {"id": 1008}, "amount": 60.0}], 52.0),
+    ([{"nutrient": {"id": 1008}, "amount": 60.0}, {"nutrient": {"id": 2047}, "amount": 52.0}], 52.0),
+    ([{"nutrient": {"id": 2047}, "amount": 0}, {"nutrient": {"id": 1008}, "amount": 60.0}], 60.0),
+    ([{"nutrient": {"id": 1008}, "amount": 60.0}], 60.0),
+])
+def test_parse_food_detail_energy_precedence(nutrients, expected_calories):
+    """Test that energy 2047 takes precedence over 1008, which only fills calories while they are zero."""
+    calories, *_ = parse_food_detail({"foodNutrients": nutrients})
+    assert calories == expected_calories
+
+def test_parse_food_detail_skips_entries_without_nutrient():
+    """Test that entries without a nutrient key are ignored."""
+    detail = parse_food_detail({
+        "foodNutrients": [
+            {"amount": 99.0},
+            {"nutrient": {"id": 1003}, "amount": 2.5},
+            {"name": "Water", "amount": 80.0},
+            {"nutrient": {"id": 2000}, "amount": 1.5}
+        ],
+        "servingSize": 50,
+        "servingSizeUnit": "g"
+    })
+    assert detail == (0.0, 2.5, 0.0, 0.0, 0.0, 1.5, 50)
+
+def test_invalid_requests_rejected():
+    """Test that calculator requests with unknown fields or out-of-range optional fields are rejected."""
+    response = client.post(
+        "/bmi",
+        json={"weight_kg": 70, "height_cm": 175, "age": 30}
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/body-fat",
+        json={
+            "gender": "female",
+            "age": 30,
+            "weight_kg": 65,
+            "height_cm": 165,
+            "neck_circumference_cm": 32,
+            "waist_circumference_cm": 70,
+            "hip_circumference_cm": -1
+        }
+    )
+    assert response.status_code == 422
+
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
 def test_calculate_food_nutrition(mock_client):
     """Test the food nutrition calculation endpoint."""
-    # Mock the httpx.AsyncClient
-    mock_client_instance = AsyncMock()
-    mock_client.return_value.__aenter__.return_value = mock_client_instance
-    
     # Mock the search response
     mock_search_response = MagicMock()
     mock_search_response.raise_for_status = MagicMock()
@@ -180,7 +272,7 @@ def test_calculate_food_nutrition(mock_client):
     }
     
     # Set up the mock responses
-    mock_client_instance.get.side_effect = [mock_search_response, mock_detail_response]
+    mock_client.get.side_effect = [mock_search_response, mock_detail_response]
     
     # Make the request
     response = client.get(
@@ -211,5 +303,209 @@ def test_calculate_food_nutrition(mock_client):
     assert data["total_fiber_g"] == pytest.approx(3.06, 0.1)  # 2.04 * 1.5
     assert data["total_sugar_g"] == pytest.approx(18.33, 0.1)  # 12.22 * 1.5
 
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_multiple_ingredients(mock_client):
+    """Test that results keep the input order when some ingredients are not found."""
+    def get(url, params=None):
+        if url.endswith("/foods/search"):
+            if params["query"] == "unicorn":
+                return _usda_response({"foods": []})
+            return _usda_response({"foods": [{"fdcId": 1, "description": "Rice, white, cooked"}]})
+        return _usda_response({
+            "foodNutrients": [
+                {"nutrient": {"id": 1008}, "amount": 130.0},  # Calories (secondary)
+                {"nutrient": {"id": 1003}, "amount": 2.7},  # Protein
+            ],
+            "servingSize": 100,
+            "servingSizeUnit": "g"
+        })
+
+    mock_client.get.side_effect = get
+
+    response = client.get(
+        "/food-nutrition",
+        params={
+            "ingredients": ["unicorn", "rice"],
+            "amounts": [50, 200]
+        }
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [food["name"] for food in data["foods"]] == ["unicorn", "Rice, white, cooked"]
+    assert data["foods"][0]["error"] == "Food not found"
+    assert data["total_calories"] == pytest.approx(260.0, 0.01)
+    assert data["total_protein_g"] == pytest.approx(5.4, 0.01)
+
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_uses_cache(mock_client):
+    """Test that repeated ingredients are served from the USDA caches."""
+    mock_search_response = _usda_response({
+        "foods": [{"fdcId": 42, "description": "Bananas, raw"}]
+    })
+    mock_detail_response = _usda_response({
+        "foodNutrients": [{"nutrient": {"id": 2047}, "amount": 89.0}],
+        "servingSize": 100,
+        "servingSizeUnit": "g"
+    })
+    mock_client.get.side_effect = [mock_search_response, mock_detail_response]
+
+    for _ in range(2):
+        response = client.get(
+            "/food-nutrition",
+            params={"ingredients": ["banana"], "amounts": [100]}
+        )
+        assert response.status_code == 200
+        assert response.json()["total_calories"] == pytest.approx(89.0, 0.01)
+
+    assert mock_client.get.call_count == 2
+
+@patch('main.get_food_item_from_llm', new_callable=AsyncMock)
+@patch.object(app.state, 'openai_client', new_callable=MagicMock)
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_with_llm(mock_client, mock_openai_client, mock_llm):
+    """Test that the LLM pick selects which search result is used."""
+    mock_search_response = _usda_response({
+        "foods": [
+            {"fdcId": 1, "description": "Apple pie"},
+            {"fdcId": 2, "description": "Apples, raw"}
+        ]
+    })
+    mock_detail_response = _usda_response({
+        "foodNutrients": [{"nutrient": {"id": 2047}, "amount": 52.0}],
+        "servingSize": 100,
+        "servingSizeUnit": "g"
+    })
+    mock_client.get.side_effect = [mock_search_response, mock_detail_response]
+    mock_llm.return_value = {"index": 1}
+
+    response = client.get(
+        "/food-nutrition",
+        params={"ingredients": ["apple"], "amounts": [100]}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["foods"][0]["name"] == "Apples, raw"
+    assert data["total_calories"] == pytest.approx(52.0, 0.01)
+    mock_llm.assert_awaited_once_with(mock_openai_client, "apple", ("Apple pie", "Apples, raw"))
+    assert mock_client.get.call_args.args[0].endswith("/food/2")
+
+@patch('main.get_food_item_from_llm', new_callable=AsyncMock)
+@patch.object(app.state, 'openai_client', new_callable=MagicMock)
+@patch.object(app.state, 'usda_semaphore', new_callable=lambda: asyncio.Semaphore(1))
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_llm_does_not_hold_usda_slot(mock_client, mock_semaphore, mock_openai_client, mock_llm):
+    """Test that the shared USDA semaphore is released while the LLM picks a food."""
+    mock_client.get.side_effect = [
+        _usda_response({
+            "foods": [
+                {"fdcId": 1, "description": "Apple pie"},
+                {"fdcId": 2, "description": "Apples, raw"}
+            ]
+        }),
+        _usda_response({
+            "foodNutrients": [{"nutrient": {"id": 2047}, "amount": 52.0}],
+            "servingSize": 100,
+            "servingSizeUnit": "g"
+        })
+    ]
+
+    async def pick(*args):
+        assert not mock_semaphore.locked()
+        return {"index": 1}
+
+    mock_llm.side_effect = pick
+
+    response = client.get(
+        "/food-nutrition",
+        params={"ingredients": ["apple"], "amounts": [100]}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["total_calories"] == pytest.approx(52.0, 0.01)
+    mock_llm.assert_awaited_once()
+
+@patch('main.get_food_item_from_llm', new_callable=AsyncMock)
+@patch.object(app.state, 'openai_client', new_callable=MagicMock)
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_single_result_skips_llm(mock_client, mock_openai_client, mock_llm):
+    """Test that the LLM is not asked to pick when the search is unambiguous."""
+    mock_search_response = _usda_response({
+        "foods": [{"fdcId": 3, "description": "Oats"}]
+    })
+    mock_detail_response = _usda_response({
+        "foodNutrients": [{"nutrient": {"id": 2047}, "amount": 379.0}],
+        "servingSize": 100,
+        "servingSizeUnit": "g"
+    })
+    mock_client.get.side_effect = [mock_search_response, mock_detail_response]
+
+    response = client.get(
+        "/food-nutrition",
+        params={"ingredients": ["oats"], "amounts": [50]}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["total_calories"] == pytest.approx(189.5, 0.01)
+    mock_llm.assert_not_awaited()
+
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_null_amount(mock_client):
+    """Test that a food with a null nutrient amount is reported as an error and left out of the totals."""
+    def get(url, params=None):
+        if url.endswith("/foods/search"):
+            fdc_id = 10 if params["query"] == "broken" else 11
+            return _usda_response({"foods": [{"fdcId": fdc_id, "description": params["query"]}]})
+        amount = None if url.endswith("/food/10") else 100.0
+        return _usda_response({
+            "foodNutrients": [{"nutrient": {"id": 2047}, "amount": amount}],
+            "servingSize": 100,
+            "servingSizeUnit": "g"
+        })
+
+    mock_client.get.side_effect = get
+
+    response = client.get(
+        "/food-nutrition",
+        params={"ingredients": ["broken", "valid"], "amounts": [100, 100]}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert "error" in data["foods"][0]
+    assert data["foods"][0]["calories"] == 0
+    assert "error" not in data["foods"][1]
+    assert data["total_calories"] == pytest.approx(100.0, 0.01)
+
+@patch.object(app.state, 'httpx_client', new_callable=AsyncMock)
+def test_calculate_food_nutrition_malformed_detail(mock_client):
+    """Test that invalid USDA detail payloads only fail the affected food items and are not cached."""
+    details = {
+        20: {"foodNutrients": [{"nutrient": {"id": 2047}, "amount": float("nan")}], "servingSize": 100},
+        21: {"foodNutrients": [{"nutrient": {"id": 2047}, "amount": 50.0}], "servingSize": "abc"},
+        22: {"foodNutrients": [{"nutrient": {"id": 2047}, "amount": 50.0}], "servingSize": 0},
+        23: {"foodNutrients": [{"nutrient": {"id": 2047}, "amount": 130.0}], "servingSize": 100},
+    }
+    queries = {"nan": 20, "text serving": 21, "zero serving": 22, "rice": 23}
+
+    def get(url, params=None):
+        if url.endswith("/foods/search"):
+            return _usda_response({"foods": [{"fdcId": queries[params["query"]], "description": params["query"]}]})
+        return _usda_response(details[int(url.rsplit("/", 1)[1])])
+
+    mock_client.get.side_effect = get
+
+    response = client.get(
+        "/food-nutrition",
+        params={"ingredients": list(queries), "amounts": [100, 100, 100, 100]}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [("error" in food) for food in data["foods"]] == [True, True, True, False]
+    assert data["total_calories"] == pytest.approx(130.0, 0.01)
+    assert [FOOD_DETAIL_CACHE.get(fdc_id) is None for fdc_id in details] == [True, True, True, False]
+
 if __name__ == "__main__":
     pytest.main(["-v", "test_main.py"])
\ No newline at end of file